@@ -1,9 +1,13 @@
 import os
 import csv
+import time
+import hashlib
 import asyncio
-import requests
-from datetime import datetime
+import aiohttp
+import orjson
+from datetime import datetime, timedelta
 from telegram import Bot
+from telegram.error import BadRequest, RetryAfter
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
 
 # ================= CONFIG ================= #
@@ -14,6 +18,12 @@ SERPAPI_KEY = os.getenv("SERPAPI_KEY")
 
 CSV_FILE = "top_500_h1b_companies_ats_fallbacks.csv"
 CHECK_INTERVAL_MINUTES = 5
+MAX_CONCURRENT_FETCHES = 20
+SEND_INTERVAL_SECONDS = 3  # Telegram allows ~20 messages/min per group
+MAX_SEND_ATTEMPTS = 3
+SUMMARY_MAX_CHARS = 700
+MAX_MESSAGE_CHARS = 4096
+JOB_SEPARATOR = "\n\n---\n\n"
 POSTED_FILE = "posted_jobs.txt"
 
 if not BOT_TOKEN:
@@ -26,6 +36,11 @@ if not SERPAPI_KEY:
 GROUP_CHAT_ID = int(GROUP_CHAT_ID)
 bot = Bot(token=BOT_TOKEN)
 
+# shared HTTP session, created lazily inside the running event loop
+_session = None
+
+_last_send = 0.0
+
 # ================= ROLES ================= #
 
 ROLE_QUERY = (
@@ -43,13 +58,21 @@ ROLE_QUERY = (
 def load_posted_jobs():
     try:
         with open(POSTED_FILE, "r") as f:
-            return set(line.strip() for line in f)
+            posted = set(f.read().splitlines())
+        posted.discard("")
+        return posted
     except FileNotFoundError:
         return set()
 
-def save_posted_job(job_id):
+def save_posted_jobs(job_ids):
+    if not job_ids:
+        return
+    POSTED_JOBS.update(job_ids)
     with open(POSTED_FILE, "a") as f:
-        f.write(job_id + "\n")
+        f.writelines(job_id + "\n" for job_id in job_ids)
+
+# job IDs and content keys, loaded once; save_posted_jobs keeps it in sync with the file
+POSTED_JOBS = load_posted_jobs()
 
 def load_companies():
     companies = []
@@ -87,7 +110,7 @@ def load_companies():
                     part = part.strip()
                     if part:
                         # remove protocol if present
-                        part = part.replace("https://", "").replace("http://", "")
+                        part = part.removeprefix("https://").removeprefix("http://")
                         sites.append(part)
 
             if not sites:
@@ -95,12 +118,22 @@ def load_companies():
 
             companies.append({
                 "company": company,
-                "sites": sites
+                # drop duplicate URLs, keep CSV order
+                "sites": tuple(dict.fromkeys(sites))
             })
 
     print(f"✅ Loaded {len(companies)} companies with ATS fallbacks")
     return companies
 
+# static config, loaded once at startup
+COMPANIES = load_companies()
+SITES_FLAT = [(c["company"], site) for c in COMPANIES for site in c["sites"]]
+
+def job_content_key(job):
+    # same posting often shows up under several of a company's sites
+    raw = f"{job['title'].lower()}|{job['company'].lower()}|{job['location'].lower()}"
+    return hashlib.blake2b(raw.encode(), digest_size=8).hexdigest()
+
 def is_within_24_hours(posted_at: str) -> bool:
     if not posted_at:
         return False
@@ -122,9 +155,22 @@ def is_within_24_hours(posted_at: str) -> bool:
 
     return False
 
+def get_session():
+    global _session
+    if _session is None or _session.closed:
+        _session = aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(limit=50, ttl_dns_cache=300),
+            timeout=aiohttp.ClientTimeout(total=20)
+        )
+    return _session
+
+async def close_session():
+    if _session is not None and not _session.closed:
+        await _session.close()
+
 # ================= SERPAPI FETCH ================= #
 
-def fetch_company_jobs(company, site):
+async def fetch_company_jobs(session, company, site):
     url = "https://serpapi.com/search.json"
     params = {
         "engine": "google_jobs",
@@ -135,7 +181,8 @@ def fetch_company_jobs(company, site):
     }
 
     try:
-        res = requests.get(url, params=params, timeout=20).json()
+        async with session.get(url, params=params) as r:
+            res = orjson.loads(await r.read())
     except Exception:
         return []
 
@@ -155,7 +202,7 @@ def fetch_company_jobs(company, site):
             "title": j["title"],
             "company": company,
             "location": j.get("location", "United States"),
-            "summary": j.get("description", ""),
+            "summary": (j.get("description") or "")[:SUMMARY_MAX_CHARS],
             "url": apply_opts[0].get("link"),
             "source": site,
             "posted": posted_at
@@ -163,51 +210,158 @@ def fetch_company_jobs(company, site):
 
     return jobs
 
+async def _bounded(sem, coro):
+    async with sem:
+        return await coro
+
 # ================= POSTING ================= #
 
-async def post_job(job):
-    msg = (
-        f"📌 *{job['title']}*\n\n"
-        f"🏢 {job['company']}\n"
-        f"📍 {job['location']}\n"
-        f"🌐 Source: {job['source']}\n"
-        f"⏱ Posted: {job['posted']}\n\n"
-        f"📝 {job['summary'][:700]}\n\n"
-        f"🔗 [Apply Here]({job['url']})"
-    )
-
-    await bot.send_message(
-        chat_id=GROUP_CHAT_ID,
-        text=msg,
-        parse_mode="Markdown",
-        disable_web_page_preview=True
-    )
+JOB_MESSAGE_TEMPLATE = (
+    "📌 *{title}*\n\n"
+    "🏢 {company}\n"
+    "📍 {location}\n"
+    "🌐 Source: {source}\n"
+    "⏱ Posted: {posted}\n\n"
+    "📝 {summary}\n\n"
+    "🔗 [Apply Here]({url})"
+)
+
+def format_job(job):
+    return JOB_MESSAGE_TEMPLATE.format_map(job)
+
+def batch_jobs(jobs):
+    # pack consecutive jobs into messages under Telegram's length limit
+    batch, texts, size = [], [], 0
+
+    for job in jobs:
+        text = format_job(job)
+        extra = len(text) + (len(JOB_SEPARATOR) if texts else 0)
+        if texts and size + extra > MAX_MESSAGE_CHARS:
+            yield batch, JOB_SEPARATOR.join(texts)
+            batch, texts, size = [], [], 0
+            extra = len(text)
+        batch.append(job)
+        texts.append(text)
+        size += extra
+
+    if texts:
+        yield batch, JOB_SEPARATOR.join(texts)
+
+async def send_message(text):
+    global _last_send
+
+    for attempt in range(1, MAX_SEND_ATTEMPTS + 1):
+        wait = _last_send + SEND_INTERVAL_SECONDS - time.monotonic()
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+        try:
+            await bot.send_message(
+                chat_id=GROUP_CHAT_ID,
+                text=text,
+                parse_mode="Markdown",
+                disable_web_page_preview=True
+            )
+            _last_send = time.monotonic()
+            return
+        except RetryAfter as e:
+            if attempt == MAX_SEND_ATTEMPTS:
+                raise
+
+            retry_after = e.retry_after
+            if isinstance(retry_after, timedelta):
+                retry_after = retry_after.total_seconds()
+            print(f"⏳ Rate limited, retrying in {retry_after}s")
+            _last_send = time.monotonic()
+            await asyncio.sleep(retry_after)
+
+def is_parse_error(e):
+    return "can't parse entities" in str(e).lower()
+
+def record_job(job, posted_ids, status):
+    posted_ids.extend((job["id"], job_content_key(job)))
+    print(f"{status}: {job['title']} ({job['company']})")
+
+async def post_batch(batch, text, posted_ids):
+    # jobs are recorded as soon as they are sent, so a later failure can't
+    # drop them; ones Telegram's Markdown parser rejects on their own are
+    # recorded too, otherwise they would fail again on every run
+    try:
+        await send_message(text)
+    except BadRequest as e:
+        if not is_parse_error(e):
+            raise
+    else:
+        for job in batch:
+            record_job(job, posted_ids, "✅ Posted")
+        return
+
+    if len(batch) == 1:
+        record_job(batch[0], posted_ids, "⚠️ Skipped unparseable job")
+        return
+
+    print(f"⚠️ Message rejected, sending {len(batch)} jobs one by one")
+    for job in batch:
+        try:
+            await send_message(format_job(job))
+        except BadRequest as e:
+            if not is_parse_error(e):
+                raise
+            record_job(job, posted_ids, "⚠️ Skipped unparseable job")
+            continue
+        record_job(job, posted_ids, "✅ Posted")
 
 # ================= MAIN JOB LOOP ================= #
 
 async def check_and_post_jobs():
     print("🔍 Checking for new jobs...")
-    posted = load_posted_jobs()
-    companies = load_companies()
+    posted = POSTED_JOBS
 
-    new_jobs = []
+    session = get_session()
+    sem = asyncio.Semaphore(MAX_CONCURRENT_FETCHES)
 
-    for c in companies:
-        for site in c["sites"]:
-            jobs = fetch_company_jobs(c["company"], site)
-            for job in jobs:
-                if job["id"] not in posted:
-                    new_jobs.append(job)
+    tasks = [
+        fetch_company_jobs(session, company, site)
+        for company, site in SITES_FLAT
+    ]
+    results = await asyncio.gather(*[_bounded(sem, t) for t in tasks])
+
+    new_jobs = []
+    seen = set()
+
+    for jobs in results:
+        for job in jobs:
+            # content keys are journaled with the IDs, so a posting that comes
+            # back under another ID is dropped on later runs as well
+            key = job_content_key(job)
+            if job["id"] in posted or key in posted:
+                # IDs journaled without a key still block their copies
+                seen.add(key)
+                continue
+            if job["id"] in seen or key in seen:
+                continue
+            seen.update((job["id"], key))
+            new_jobs.append(job)
 
     if not new_jobs:
         print("⏸ No new jobs")
         return
 
-    for job in new_jobs:
-        await post_job(job)
-        save_posted_job(job["id"])
-        print(f"✅ Posted: {job['title']} ({job['company']})")
+    posted_ids = []
+    try:
+        for batch, text in batch_jobs(new_jobs):
+            await post_batch(batch, text, posted_ids)
+    finally:
+        # one append per tick; still records what was sent if posting fails
+        save_posted_jobs(posted_ids)
+
+async def main():
+    try:
+        await check_and_post_jobs()
+    finally:
+        await close_session()
+
 if __name__ == "__main__":
-    asyncio.run(check_and_post_jobs())
+    asyncio.run(main())
 
 